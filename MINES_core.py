@@ -1,7 +1,33 @@
+import os
+import concurrent.futures
 from isru_plants import *
 from plant_model import *
 
 
+# Executes a single plant test case and returns its report. Test cases are fully
+# independent, so this may be run in worker processes and the reports printed in order afterwards
+def RunTestCase(header, plant_def, request, time_step):
+    plant_model = ISRUPlant(plant_def)
+    # Execute test
+    plant_model.setup(request, time_step)
+    plant_model.run(time_step)
+    # Return header and results
+    return "\n".join([header, plant_model.reportSummary()])
+
+# Runs a list of (header, plant_def, request, time_step) test cases, printing results in the given order
+# Each case only takes a fraction of a millisecond, so they run serially unless parallel execution is requested;
+# starting a process pool costs more than the current test sets themselves
+def RunTestCases(test_jobs, arg_parallel=False):
+    if not arg_parallel:
+        for report in map(RunTestCase, *zip(*test_jobs)):
+            print(report)
+        return
+    max_workers = max(1, (os.cpu_count() or 1) - 2)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for report in executor.map(RunTestCase, *zip(*test_jobs)):
+            print(report)
+
+
 # The following function executes planned tests for the SPRS501 group project presentation
 # Notes to calibrate & scale plant model execution
 # Canonical processing window for Martian ISRU fuel plant is 480 days (Kleinhenz et al., "Benefits of Mars ISRU...")
@@ -17,33 +43,30 @@ def RunPresentationTests():
 
     # Define ISRU plants under test and organize into dicts
     # For now, run on only a subset of the possible combinations
-    base_plant_h2 = copy.deepcopy(plant_lo2_lh2)  #| copy.deepcopy(plant_bagging)
-    full_plant_h2 = copy.deepcopy(plant_lo2_lh2)  | copy.deepcopy(plant_sinter)
-    #metal_plant_h2 = copy.deepcopy(plant_lo2_lh2)  | copy.deepcopy(plant_sinter)
-    base_plant_ch4 = copy.deepcopy(plant_lo2_ch4) #| copy.deepcopy(plant_bagging)
-    full_plant_ch4 = copy.deepcopy(plant_lo2_ch4) | copy.deepcopy(plant_sinter)
+    # Plant definitions are shared templates; ISRUPlant snapshots its own per-run state
+    base_plant_h2 = plant_lo2_lh2()  # + plant_bagging
+    full_plant_h2 = MergePlants(plant_lo2_lh2(), plant_sinter())
+    #metal_plant_h2 = MergePlants(plant_lo2_lh2(), plant_sinter())
+    base_plant_ch4 = plant_lo2_ch4() # + plant_bagging
+    full_plant_ch4 = MergePlants(plant_lo2_ch4(), plant_sinter())
     test_cases = {'base_h2': base_plant_h2, 'full_h2': full_plant_h2, 'base_ch4': base_plant_ch4, 'full_ch4': full_plant_ch4}
-    regolith_opts = {'no_ice': regolith_hydrate, 'yes_ice': regolith_icy}
+    regolith_opts = {'no_ice': regolith_hydrate(), 'yes_ice': regolith_icy()}
 
     # Iterate through test cases and record relevant results
+    test_jobs = []
     for case_name, case_dict in test_cases.items():
         for reg_name, regolith in regolith_opts.items():
-            copy_dict = copy.deepcopy(case_dict)
-            copy_dict = SetInputRegolith(copy_dict, regolith, reg_name)
-            plant_model = ISRUPlant(copy_dict)
+            copy_dict = SetInputRegolith(case_dict, regolith, reg_name)
             time_step = 24*60*60 # One day in seconds
             if '_h2' in case_name:
                 target_mass = target_lo2_lh2 / scaledown_factor
             else:
                 target_mass = target_lo2_ch4 / scaledown_factor
             request = {'Fuel_Storage': target_mass}
-            # Execute test
-            plant_model.setup(request, time_step)
-            plant_model.run(time_step)
-            # Print header and results
-            print("\n\n------ UUT {} with regolith {} ------".format(case_name, reg_name))
-            plant_model.reportSummary()
-            #print("\n")
+            header = "\n\n------ UUT {} with regolith {} ------".format(case_name, reg_name)
+            test_jobs.append((header, copy_dict, request, time_step))
+    # Execute tests, then print headers and results
+    RunTestCases(test_jobs)
 
 
 # The following function executes planned tests for the SPRS501 group project final report
@@ -55,53 +78,37 @@ def RunReportTests():
 
     # Define ISRU plants under test and organize into dicts
     # For now, run on only a subset of the possible combinations
-    base_plant_h2 = copy.deepcopy(plant_lo2_lh2)  #| copy.deepcopy(plant_bagging)
-    full_plant_h2 = copy.deepcopy(plant_lo2_lh2)  | copy.deepcopy(plant_sinter)
-    #metal_plant_h2 = copy.deepcopy(plant_lo2_lh2)  | copy.deepcopy(plant_sinter)
-    base_plant_ch4 = copy.deepcopy(plant_lo2_ch4) #| copy.deepcopy(plant_bagging)
-    full_plant_ch4 = copy.deepcopy(plant_lo2_ch4) | copy.deepcopy(plant_sinter)
+    # Plant definitions are shared templates; ISRUPlant snapshots its own per-run state
+    base_plant_h2 = plant_lo2_lh2()  # + plant_bagging
+    full_plant_h2 = MergePlants(plant_lo2_lh2(), plant_sinter())
+    #metal_plant_h2 = MergePlants(plant_lo2_lh2(), plant_sinter())
+    base_plant_ch4 = plant_lo2_ch4() # + plant_bagging
+    full_plant_ch4 = MergePlants(plant_lo2_ch4(), plant_sinter())
     test_cases = {'base_h2': base_plant_h2, 'full_h2': full_plant_h2, 'base_ch4': base_plant_ch4, 'full_ch4': full_plant_ch4}
 
     # Iterate through test cases and record relevant results
+    test_jobs = []
     for case_name, case_dict in test_cases.items():
-        copy_dict = copy.deepcopy(case_dict)
-        copy_dict = SetInputRegolith(copy_dict, regolith_icy, 'yes_ice')
-        plant_model = ISRUPlant(copy_dict)
+        copy_dict = SetInputRegolith(case_dict, regolith_icy(), 'yes_ice')
         time_step = 24*60*60 # One day in seconds
         if '_h2' in case_name:
             target_mass = target_lo2_lh2 / scaledown_factor
         else:
             target_mass = target_lo2_ch4 / scaledown_factor
         request = {'Fuel_Storage': target_mass}
-        # Execute test
-        plant_model.setup(request, time_step)
-        plant_model.run(time_step)
-        # Print header and results
-        print("\n\n------ UUT {} ------".format(case_name))
-        plant_model.reportSummary()
-        #print("\n")
+        test_jobs.append(("\n\n------ UUT {} ------".format(case_name), copy_dict, request, time_step))
 
     # Perform the same analysis on the metals plant
-    metals_test = copy.deepcopy(plant_metals_base)
-    metals_plant = ISRUPlant(metals_test)
     time_step = 24*60*60 # One day in seconds
     target_mass = 25000/365 # Rate of 25 mT/year
     request = {'Metals_Storage': target_mass}
-    # Execute test
-    metals_plant.setup(request, time_step)
-    metals_plant.run(time_step)
-    # Print header and results
-    print("\n\n------ UUT metals_only ------")
-    metals_plant.reportSummary()
-
-    metals_addon_test = copy.deepcopy(plant_metals_base) | copy.deepcopy(plant_metals_refine_sideproducts)
-    metals_addon_plant = ISRUPlant(metals_addon_test)
-    # Execute test
-    metals_addon_plant.setup(request, time_step)
-    metals_addon_plant.run(time_step)
-    # Print header and results
-    print("\n\n------ UUT metals_full ------")
-    metals_addon_plant.reportSummary()
+    test_jobs.append(("\n\n------ UUT metals_only ------", plant_metals_base(), request, time_step))
+
+    metals_addon_test = MergePlants(plant_metals_base(), plant_metals_refine_sideproducts())
+    test_jobs.append(("\n\n------ UUT metals_full ------", metals_addon_test, request, time_step))
+
+    # Execute tests, then print headers and results
+    RunTestCases(test_jobs)
 
 
 
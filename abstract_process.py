@@ -1,5 +1,6 @@
 import mars
 import math
+import functools
 
 from abstract_resource import *
 import resources as resourceLib
@@ -13,12 +14,31 @@ class Component:
         self.Phase = arg_phase
         self.Rate = arg_rate    # kg/s
 
+    def __reduce__(self):
+        # Minimal pickle / clone representation - just the constructor arguments
+        return (Component, (self.Name, self.Phase, self.Rate))
+
 # Data storage class used by Processes to define chemical or mechanical changes that process entails
 class Transform:
     def __init__(self, arg_inputs=[], arg_outputs=[], arg_power=0):
         self.inputs = {component.Name: component for component in arg_inputs}   # List of Components
         self.outputs = {component.Name: component for component in arg_outputs} # List of Components
         self.Power = arg_power # W
+        # Flattened name / rate vectors, built once so per-step mass calculations don't rebuild dicts.
+        # Masses returned by the vector getters below are ordered to match these names
+        self._in_names = tuple(self.inputs.keys())
+        self._in_rates = tuple(component.Rate for component in self.inputs.values())
+        self._in_index = {name: index for index, name in enumerate(self._in_names)}
+        self._out_names = tuple(self.outputs.keys())
+        self._out_rates = tuple(component.Rate for component in self.outputs.values())
+        self._out_index = {name: index for index, name in enumerate(self._out_names)}
+        # Per-time-step masses, memoized since the step size is normally fixed for a whole run
+        self._input_mass_cache = {}
+        self._output_mass_cache = {}
+
+    def __reduce__(self):
+        # Minimal pickle / clone representation; the flattened tables are rebuilt by the constructor
+        return (Transform, (list(self.inputs.values()), list(self.outputs.values()), self.Power))
 
     def get_input_masses(self, arg_time):
         return {name: arg_time*component.Rate for name, component in self.inputs.items()}
@@ -26,11 +46,86 @@ class Transform:
     def get_output_masses(self, arg_time):
         return {name: arg_time*component.Rate for name, component in self.outputs.items()}
 
+    # Positional versions of the above for the per-step kernels, ordered to match _in_names / _out_names
+    # The returned tuples are shared between calls and must not be modified
+    def get_input_mass_vector(self, arg_time):
+        masses = self._input_mass_cache.get(arg_time)
+        if masses is None:
+            masses = self._input_mass_cache[arg_time] = tuple(arg_time*rate for rate in self._in_rates)
+        return masses
+
+    def get_output_mass_vector(self, arg_time):
+        masses = self._output_mass_cache.get(arg_time)
+        if masses is None:
+            masses = self._output_mass_cache[arg_time] = tuple(arg_time*rate for rate in self._out_rates)
+        return masses
+
+
+# Numeric core of Process.run. Operates on flat sequences of masses and rates ordered to match
+# the transform, so the per-step arithmetic is kept separate from the dict / Resource bookkeeping
+# For an 'ANY' transform, input_masses holds the single combined mass of all matching resources, paired with
+# the rate of the 'ANY' component; this relies on 'ANY' being a transform's only input (checked in setTransform)
+def _run_kernel(input_masses, input_rates, output_rates, power, delta_time):
+    # Single reduction over all ratios; the leading 1 caps the ratio as in the original running minimum
+    used_ratio = min([1, *(mass/(delta_time*rate) for mass, rate in zip(input_masses, input_rates))])
+    mass_removed = [delta_time*used_ratio*rate for rate in input_rates]
+    output_masses = [delta_time*used_ratio*rate for rate in output_rates]
+    energy = delta_time*power*used_ratio
+    return used_ratio, mass_removed, output_masses, energy
+
+# Generates a version of _run_kernel unrolled for a fixed number of inputs and outputs. Most transforms
+# have a small, fixed set of named resources, so this removes the generic loops from the per-step path.
+# Generated kernels are cached per shape and share the signature (and exact arithmetic) of _run_kernel
+@functools.cache
+def _specialize_run_kernel(num_inputs, num_outputs):
+    masses = ", ".join("m{}".format(i) for i in range(num_inputs))
+    in_rates = ", ".join("r{}".format(i) for i in range(num_inputs))
+    out_rates = ", ".join("o{}".format(i) for i in range(num_outputs))
+    ratios = "".join(", m{0}/(delta_time*r{0})".format(i) for i in range(num_inputs))
+    source = "\n".join([
+        "def _run_kernel_{}_{}(input_masses, input_rates, output_rates, power, delta_time):".format(num_inputs, num_outputs),
+        "    {}, = input_masses".format(masses),
+        "    {}, = input_rates".format(in_rates),
+        "    {}, = output_rates".format(out_rates) if num_outputs > 0 else "",
+        "    used_ratio = min(1{})".format(ratios),
+        "    scale = delta_time*used_ratio",
+        "    mass_removed = [{}]".format(", ".join("scale*r{}".format(i) for i in range(num_inputs))),
+        "    output_masses = [{}]".format(", ".join("scale*o{}".format(i) for i in range(num_outputs))),
+        "    return used_ratio, mass_removed, output_masses, delta_time*power*used_ratio",
+    ])
+    namespace = {}
+    exec(source, namespace)
+    return namespace["_run_kernel_{}_{}".format(num_inputs, num_outputs)]
+
+# Mass left in each input after removal, or None where the input has been entirely used
+def _remaining_kernel(input_masses, mass_removed):
+    # Account for floating point error - if 99.999% of an input resource has been used, the entire resource has been used
+    return [mass - removed if not abs(1-(mass/removed)) <= ZERO_TOL else None
+            for mass, removed in zip(input_masses, mass_removed)]
+
+# Numeric core of Process.request, mirroring the above in the backwards direction
+def _request_kernel(request_masses, request_rates, input_rates, power, delta_time):
+    used_ratio = max([0, *(mass/(delta_time*rate) for mass, rate in zip(request_masses, request_rates))])
+    input_masses = [delta_time*used_ratio*rate for rate in input_rates]
+    energy = delta_time*power*used_ratio
+    return used_ratio, input_masses, energy
+
+
+# All slot names declared along a class's MRO, used to copy slotted processes
+@functools.cache
+def _slot_names(arg_class):
+    return tuple(name for cls in arg_class.__mro__ for name in cls.__dict__.get('__slots__', ()))
 
 # This class defines an abstract "process" type which defines a transformation
 # between two sets of resources, taking into account power consumption and heat production
 # TODO: Allow for _both_ a global process temperature/pressure and a specific temperature/pressure per resource!
 class Process:
+    # Fixed attribute layout. Concrete processes that do not declare their own slots still get a __dict__
+    __slots__ = ('Name', 'Whitelist', 'RequestWhitelist', 'Filter', 'Transform', 'Temperature', 'Pressure',
+                 'energy_demand', 'duty_cycle', 'upstream_energy_demand', '_step_outputs', '_step_requests',
+                 '_input_names_set', '_any_phase', '_kernel_shape', '_request_rates', '_output_classes',
+                 '_input_classes')
+
     def __init__(self, arg_name="process_undefined", arg_filter=False):
         self.Name = arg_name
         self.Whitelist = None
@@ -42,12 +137,42 @@ class Process:
         self.energy_demand = 0
         self.duty_cycle = 0
         self.upstream_energy_demand = 0
+        # Reusable result buffers for run() / request(). The returned dicts are only valid until the next
+        # call of the same method on this process - callers must not hold on to them across calls
+        self._step_outputs = {}
+        self._step_requests = {}
+
+    def __copy__(self):
+        # Shallow copies share configuration (transform, lookup tables) but each needs its own result buffers
+        clone = self.__class__.__new__(self.__class__)
+        for name in _slot_names(self.__class__):
+            if hasattr(self, name):
+                setattr(clone, name, getattr(self, name))
+        if hasattr(self, '__dict__'):
+            clone.__dict__.update(self.__dict__)
+        clone._step_outputs = {}
+        clone._step_requests = {}
+        return clone
 
     def setTransform(self, arg_transform):
         # Helper function, exposes several useful transform properties
         self.Transform = arg_transform
-        self.Whitelist = list(self.Transform.inputs.keys())
-        self.RequestWhitelist = list(self.Transform.outputs.keys())
+        # Whitelists are only used for membership tests, so they are kept as frozensets
+        self.Whitelist = frozenset(self.Transform.inputs.keys())
+        self.RequestWhitelist = frozenset(self.Transform.outputs.keys())
+        # Lookup tables used by the numeric kernels. 'ANY' transforms are treated as a single input
+        self._input_names_set = set(self.Transform._in_names)
+        self._any_phase = self.Transform.inputs['ANY'].Phase if 'ANY' in self.Transform.inputs else None
+        if self._any_phase is not None and len(self.Transform.inputs) > 1:
+            raise ValueError("Process {} combines an 'ANY' input with other inputs".format(self.Name))
+        # Fixed-shape transforms use a run kernel specialized to their number of inputs / outputs
+        self._kernel_shape = None
+        if self._any_phase is None and len(self.Transform.inputs) > 0:
+            self._kernel_shape = (len(self.Transform.inputs), len(self.Transform.outputs))
+        self._request_rates = tuple(component.Rate for name, component in self.Transform.inputs.items() if name != 'ANY')
+        # Resource class handles used to construct outputs / requests, resolved once here rather than every step
+        self._output_classes = {name: getattr(resourceLib, name) for name in self.Transform.outputs}
+        self._input_classes = {name: getattr(resourceLib, name) for name in self.Transform.inputs if name != 'ANY'}
 
     def configureInputs(self, input_resources):
         # Helper function used by run() and several child classes to modify input resource
@@ -85,49 +210,52 @@ class Process:
         self.energy_demand = 0
         self.configureInputs(input_resources)
         # Isolate resources that will not be used for passthrough
+        any_phase = self._any_phase
         passthrough_resources = {}
-        for resource_name, input_resource in input_resources.items():
-            if 'ANY' in self.Transform.inputs: # Open-ended processes only require specific phases to process
-                if input_resource.Phase != self.Transform.inputs['ANY'].Phase:
-                    passthrough_resources[resource_name] = input_resource
-            else:
-                if resource_name not in self.Transform.inputs:
-                    passthrough_resources[resource_name] = input_resource
-        for key in passthrough_resources:
-            del input_resources[key]
+        for resource_name in list(input_resources):
+            if any_phase is not None: # Open-ended processes only require specific phases to process
+                if input_resources[resource_name].Phase != any_phase:
+                    passthrough_resources[resource_name] = input_resources.pop(resource_name)
+            elif resource_name not in self._input_names_set:
+                passthrough_resources[resource_name] = input_resources.pop(resource_name)
         # Determine the potential mass of each product used given the time step,
         # then determine the limiting resource if needed
-        max_used = self.Transform.get_input_masses(delta_time)
-        used_ratio = 1
-        input_masses = 0
-        if 'ANY' in self.Transform.inputs:
-            input_masses = sum(resource.Mass for name, resource in input_resources.items())
-            used_ratio = min(used_ratio, input_masses / (self.Transform.inputs['ANY'].Rate*delta_time))
+        if any_phase is not None:
+            # Gather the matching masses once; they are reused to split the removed mass proportionally below
+            any_mass_arr = [resource.Mass for resource in input_resources.values()]
+            input_masses = sum(any_mass_arr)
+            input_mass_arr = [input_masses]
         else:
-            for name, resource in input_resources.items():
-                used_ratio = min(used_ratio, resource.Mass/max_used[name])
+            input_mass_arr = [input_resources[name].Mass for name in self.Transform._in_names]
+        run_kernel = _run_kernel if self._kernel_shape is None else _specialize_run_kernel(*self._kernel_shape)
+        used_ratio, mass_removed_arr, output_mass_arr, process_energy = run_kernel(
+            input_mass_arr, self.Transform._in_rates, self.Transform._out_rates, self.Transform.Power, delta_time)
         self.duty_cycle = used_ratio
         # Increment process energy demand as needed
-        process_energy = delta_time*self.Transform.Power*used_ratio
         self.energy_demand += process_energy
-        step_outputs = {}
+        step_outputs = self._step_outputs
+        step_outputs.clear()
         # Create outputs given inputs
-        for name, output_resource in self.Transform.outputs.items():
-            output_mass = delta_time*used_ratio*output_resource.Rate
-            newClass = getattr(resourceLib, name)
+        for (name, output_resource), output_mass in zip(self.Transform.outputs.items(), output_mass_arr):
+            newClass = self._output_classes[name]
             step_outputs[name] = newClass(output_mass, self.Temperature, self.Pressure, output_resource.Phase)
         # Subtract mass from inputs; put what remains into overage
-        for name, input_resource in input_resources.items():
-            if 'ANY' in self.Transform.inputs:
-                mass_removed = delta_time*used_ratio*self.Transform.inputs['ANY'].Rate*input_resource.Mass/input_masses
-            else:
-                mass_removed = delta_time*used_ratio*self.Transform.inputs[name].Rate
-            # Account for floating point error - if 99.999% of an input resource has been used, the entire resource has been used
-            if not abs(1-(input_resource.Mass/mass_removed)) <= ZERO_TOL:
-                input_resource.setMass(input_resource.Mass - mass_removed)
-                passthrough_resources[name] = input_resource
+        if any_phase is not None:
+            any_removed_arr = [mass_removed_arr[0]*mass/input_masses for mass in any_mass_arr]
+            remaining_arr = _remaining_kernel(any_mass_arr, any_removed_arr)
+            for (name, input_resource), remaining_mass in zip(input_resources.items(), remaining_arr):
+                if remaining_mass is not None:
+                    input_resource.setMass(remaining_mass)
+                    passthrough_resources[name] = input_resource
+        else:
+            remaining_arr = _remaining_kernel(input_mass_arr, mass_removed_arr)
+            for name, input_resource in input_resources.items():
+                remaining_mass = remaining_arr[self.Transform._in_index[name]]
+                if remaining_mass is not None:
+                    input_resource.setMass(remaining_mass)
+                    passthrough_resources[name] = input_resource
         # TODO: check for collisions
-        step_outputs = step_outputs | passthrough_resources
+        step_outputs.update(passthrough_resources)
         # Finally, return the created products
         return step_outputs
 
@@ -162,21 +290,19 @@ class Process:
                     setup_energy_next -= Heat(self.Temperature, request_resource)
         self.upstream_energy_demand = setup_energy_next # This energy is technically associated with the next process upstream
         # Determine the minimum rate needed to achieve all requested outputs
-        max_made = self.Transform.get_output_masses(delta_time)
-        used_ratio = 0
-        for name, resource in request_resources.items():
-            used_ratio = max(used_ratio, resource.Mass/max_made[name])
-        self.duty_cycle = used_ratio
-        # Note projected energy demand
-        self.energy_demand = delta_time*self.Transform.Power*used_ratio
-        step_requests = {}
+        request_mass_arr = [resource.Mass for resource in request_resources.values()]
+        request_rate_arr = [self.Transform.outputs[name].Rate for name in request_resources]
+        used_ratio, input_mass_arr, self.energy_demand = _request_kernel(
+            request_mass_arr, request_rate_arr, self._request_rates, self.Transform.Power, delta_time)
+        self.duty_cycle = used_ratio # Projected energy demand is noted by the kernel above
+        step_requests = self._step_requests
+        step_requests.clear()
         # Create requests given outputs - for now, treat Any as a None
-        for name, input_resource in self.Transform.inputs.items():
-            if name != 'ANY':
-                input_mass = delta_time*used_ratio*input_resource.Rate
-                newClass = getattr(resourceLib, name)
-                step_requests[name] = newClass(input_mass, self.Temperature, self.Pressure, input_resource.Phase)
-        step_requests = step_requests | passthrough_requests
+        input_components = (component for name, component in self.Transform.inputs.items() if name != 'ANY')
+        for input_resource, input_mass in zip(input_components, input_mass_arr):
+            newClass = self._input_classes[input_resource.Name]
+            step_requests[input_resource.Name] = newClass(input_mass, self.Temperature, self.Pressure, input_resource.Phase)
+        step_requests.update(passthrough_requests)
         # Finally, return the requested products
         return step_requests
 
@@ -186,37 +312,65 @@ class Process:
 # are used by Processes to modify the parameters of incoming resources
 
 COMPRESSOR_EFFICIENCY = 0.8 # Fairly realistic target for both liquid and gas compressors
+def _compress_solid(target_pressure, input_resource):
+    return 0
+
+def _compress_liquid(target_pressure, input_resource):
+    # In this case, the energy required, assuming a constant volume, is just V*dP
+    delta_press = target_pressure - input_resource.Pressure
+    energy = delta_press*input_resource.Volume / COMPRESSOR_EFFICIENCY
+    input_resource.Pressure = target_pressure
+    return energy
+
+def _compress_gas(target_pressure, input_resource):
+    # The gas phase requires knowing the gamma value (ratio of heat capacities) for the gas
+    # Equations are NASA-derived: https://www1.grc.nasa.gov/beginners-guide-to-aeronautics/compression-and-expansion/
+    if input_resource._cp_coeff is None:
+        input_resource.setGasConstants()
+    pressure, volume = input_resource.Pressure, input_resource.Volume
+    pressure_ratio = target_pressure/pressure
+    inv_vol_ratio = pressure_ratio**input_resource._inv_gamma
+    new_volume = volume / inv_vol_ratio
+    temp_ratio = pressure_ratio**input_resource._gamma_ratio
+    energy = (target_pressure-pressure)*(volume-new_volume) / COMPRESSOR_EFFICIENCY
+    input_resource.Pressure = target_pressure
+    input_resource.Volume = new_volume
+    input_resource.Temperature = input_resource.Temperature*temp_ratio
+    return energy
+
+def _heat_condensed(target_temperature, input_resource):
+    delta_t = target_temperature - input_resource.Temperature
+    energy = input_resource.Mass*delta_t*input_resource.Cp
+    input_resource.Temperature = target_temperature
+    return energy
+
+def _heat_gas(target_temperature, input_resource):
+    if input_resource._cp_coeff is None:
+        input_resource.setGasConstants()
+    delta_t = target_temperature - input_resource.Temperature
+    use_cp = input_resource.Mass*input_resource._cp_coeff
+    energy = input_resource.Mass*delta_t*use_cp
+    input_resource.Volume *= target_temperature/input_resource.Temperature # At constant pressure, volume scales linearly
+    input_resource.Temperature = target_temperature
+    return energy
+
+# Phase dispatch tables - any phase not listed (gas, plasma) uses the gas model
+_compress_by_phase = {'SOLID': _compress_solid, 'LIQUID': _compress_liquid}
+_heat_by_phase = {'SOLID': _heat_condensed, 'LIQUID': _heat_condensed}
+
+# Relative tolerances below which a compression / heating step is treated as a no-op. Avoids running the
+# full models for differences that are only floating point residue from earlier steps
+EPS_PRESS = 1e-6
+EPS_TEMP = 1e-6
+
 def Compress(target_pressure, input_resource):
-    if input_resource.Phase == 'SOLID':
-        return 0
-    elif input_resource.Phase == 'LIQUID':
-        # In this case, the energy required, assuming a constant volume, is just V*dP
-        delta_press = target_pressure - input_resource.Pressure
-        energy = delta_press*input_resource.Volume / COMPRESSOR_EFFICIENCY
+    if abs(target_pressure - input_resource.Pressure) < EPS_PRESS*max(1.0, input_resource.Pressure):
         input_resource.Pressure = target_pressure
-        return energy
-    else:
-        # The gas phase requires knowing the gamma value (ratio of heat capacities) for the gas
-        # Equations are NASA-derived: https://www1.grc.nasa.gov/beginners-guide-to-aeronautics/compression-and-expansion/
-        pressure_ratio = target_pressure/input_resource.Pressure
-        inv_vol_ratio = math.exp(math.log(pressure_ratio)/input_resource.Gamma)
-        new_volume = input_resource.Volume / inv_vol_ratio
-        temp_ratio = pressure_ratio**((input_resource.Gamma-1)/input_resource.Gamma)
-        energy = (target_pressure-input_resource.Pressure)*(input_resource.Volume-new_volume) / COMPRESSOR_EFFICIENCY
-        input_resource.Pressure = target_pressure
-        input_resource.Volume = new_volume
-        input_resource.Temperature *= temp_ratio
-        return energy
+        return 0
+    return _compress_by_phase.get(input_resource.Phase, _compress_gas)(target_pressure, input_resource)
 
 def Heat(target_temperature, input_resource):
-    delta_t = target_temperature - input_resource.Temperature
-    if input_resource.Phase == 'SOLID' or input_resource.Phase == 'LIQUID':
-        energy = input_resource.Mass*delta_t*input_resource.Cp
-        input_resource.Temperature = target_temperature
-        return energy
-    else:
-        use_cp = input_resource.Gamma * 8.314 * input_resource.Mass / (input_resource.Molar_Mass*(input_resource.Gamma-1))
-        energy = input_resource.Mass*delta_t*use_cp
-        input_resource.Volume *= target_temperature/input_resource.Temperature # At constant pressure, volume scales linearly
+    if abs(target_temperature - input_resource.Temperature) < EPS_TEMP*max(1.0, input_resource.Temperature):
         input_resource.Temperature = target_temperature
-        return energy
+        return 0
+    return _heat_by_phase.get(input_resource.Phase, _heat_gas)(target_temperature, input_resource)
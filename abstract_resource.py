@@ -1,12 +1,21 @@
 import mars
+import copy
 # This file defines an abstract resource class used to standardize behavior throughout the simulation
 
 # Array of matter phases, used in various calculations
 matter_phases = ['SOLID', 'LIQUID', 'GAS', 'PLASMA']
+# Phases whose volume comes from a tabulated density rather than the ideal gas law
+condensed_phases = frozenset(('SOLID', 'LIQUID'))
 ZERO_TOL = 0.00001
 
 # This class defines an abstract "resource" type and its associated physical properties
 class Resource:
+    # Fixed attribute layout. Species constants (Density, Molar_Mass, Gamma, Cp) may instead be provided as class
+    # attributes by concrete resource types, which then only store the per-instance state. Those constants
+    # are then read-only on instances of the concrete type, since the class attributes shadow these slots
+    __slots__ = ('Name', 'Mass', 'Volume', 'Density', 'Molar_Mass', 'Gamma', 'Cp', 'Temperature', 'Pressure', 'Phase',
+                 '_inv_gamma', '_gamma_ratio', '_cp_coeff')
+
     def __init__(self, arg_name="resource_undefined"):
         # Set up a baseline list of properties all materials have
         self.Name = arg_name # For ID and debugging purposes
@@ -14,21 +23,43 @@ class Resource:
         self.Volume = 0       # m^3
         self.Density = {}       #kg/m^3
         self.Molar_Mass = 0   # kg/mol
+        self.Gamma = None     # Ratio of heat capacities, needed to compress / heat a gas
+        self.Cp = None        # J/(kg*K), needed to heat a solid / liquid
         self.Temperature = 0  # K
         self.Pressure = 0     # Pa, primarily used by gases but tracked regardless
         self.Phase = matter_phases[0] # Default to Solid
+        self._inv_gamma = None   # 1/Gamma, cached for gas compression
+        self._gamma_ratio = None # (Gamma-1)/Gamma, cached for gas compression
+        self._cp_coeff = None    # Gamma*R/(Molar_Mass*(Gamma-1)), cached for gas heating
+
+    def __reduce__(self):
+        # Minimal pickle / clone representation for concrete resource types, which are constructed from
+        # mass, temperature, pressure and phase. The constructor repopulates volume and constants
+        if type(self) is Resource:
+            # Plain resources carry their state in slots, restored as the (dict, slots) state pair
+            return (Resource, (), (None, {name: getattr(self, name) for name in Resource.__slots__ if hasattr(self, name)}))
+        return (self.__class__, (self.Mass, self.Temperature, self.Pressure, self.Phase))
+
+    def clone(self):
+        # Direct copy of a concrete resource, rebuilt from the same state __reduce__ captures
+        if type(self) is Resource:
+            # Plain resources are copied slot by slot; Density is their only mutable field, so it isn't shared
+            clone = copy.copy(self)
+            clone.Density = dict(self.Density)
+            return clone
+        return self.__class__(self.Mass, self.Temperature, self.Pressure, self.Phase)
 
     def setMass(self, arg_mass):
         # Define the mass of the resource; populate volume based on phase
         # For now, don't do anything special for plasma since I don't think we'll need to model magnetohydrodynamics
         self.Mass = arg_mass
-        if self.Phase in ['SOLID', 'LIQUID']:
-            if self.Phase not in self.Density:
-                raise ValueError("Unable to calculate volume for {} with density {}".format(self.Name, self.Density))
-            if self.Phase in self.Density:
-                self.Volume = self.Mass * self.Density[self.Phase]
-            else:
-                self.Volume = None
+        phase = self.Phase
+        if phase in condensed_phases:
+            # Single lookup serves as both the availability check and the value
+            density = self.Density.get(phase)
+            if density is None:
+                raise ValueError("Unable to calculate volume for {} with density {}".format(self.Name, dict(self.Density)))
+            self.Volume = arg_mass / density
         else:
             if self.Pressure is None or self.Temperature is None:
                 self.Volume = None
@@ -37,7 +68,32 @@ class Resource:
                     raise ValueError("Unable to calculate volume for {} with pressure 0".format(self.Name))
                 if self.Molar_Mass == 0:
                     raise ValueError("Unable to calculate volume for {} with molar mass 0".format(self.Name))
-                self.setIdealGas('Volume')
+                if phase == 'GAS':
+                    # Ideal gas volume computed in place; this runs for every gas resource constructed
+                    self.Volume = arg_mass*self.Temperature*8.314 / (self.Pressure*self.Molar_Mass)
+                else:
+                    self.setIdealGas('Volume') # Raises for phases the ideal gas model doesn't cover
+
+    def _setMassUnchecked(self, arg_mass):
+        # Same update as setMass without the validation, for hot loops that only rescale a resource which
+        # has already been through setMass (so its density / pressure / molar mass are known to be usable)
+        self.Mass = arg_mass
+        phase = self.Phase
+        if phase in condensed_phases:
+            self.Volume = arg_mass / self.Density[phase]
+        else:
+            if self.Pressure is None or self.Temperature is None:
+                self.Volume = None
+            else:
+                self.Volume = arg_mass*self.Temperature*8.314 / (self.Pressure*self.Molar_Mass)
+
+    def setGasConstants(self):
+        # Cache the Gamma-derived constants used by Compress / Heat. These only depend on the species,
+        # so they are computed once per resource rather than on every compression or heating step
+        # Called lazily by the gas models, so resources without a Gamma can still be created as gases
+        self._inv_gamma = 1/self.Gamma
+        self._gamma_ratio = (self.Gamma-1)/self.Gamma
+        self._cp_coeff = self.Gamma*8.314/(self.Molar_Mass*(self.Gamma-1))
 
     def setIdealGas(self, arg_solve_for):
         # Ideal gas law modeling solves for the specified attribute assuming the other fields have been set correctly
@@ -6,10 +6,25 @@ from abstract_resource import *
 import resources as resourceLib
 from abstract_process import *
 
+# Numeric core of the Multiplex scaling. Determines the number of units needed to handle the given
+# masses at the given per-unit limits, and returns it along with the per-unit masses
+# When a single unit (or none) suffices the masses need no scaling, and None is returned in their place
+def _mux_scale(masses, limits):
+    use_ratio = max([0, *(mass/limit for mass, limit in zip(masses, limits))])
+    # Integer ceiling of the non-negative ratio, without the math.ceil call
+    num_mocks = int(use_ratio)
+    num_mocks += num_mocks < use_ratio
+    if num_mocks <= 1:
+        return num_mocks, None
+    inv_mocks = 1.0/num_mocks
+    return num_mocks, [mass * inv_mocks for mass in masses]
+
 # This class wraps a parallelizable process, and when request() is called it determines
 # the minimum number of processing units needed to achieve the desired rate. It then mocks
 # that number of units when run() is called
 class Multiplex(Process):
+    __slots__ = ('num_mocks',)
+
     def __init__(self, arg_name="multiplex_undefined", arg_filter=False):
         super().__init__(arg_name, arg_filter)
         self.num_mocks = 1
@@ -18,20 +33,27 @@ class Multiplex(Process):
 
     def run(self, delta_time, input_resources):
         # Determine the minimum number of units needed to process all of the given input
-        max_per_unit = self.Transform.get_input_masses(delta_time)
-        use_ratio = 0
-        for name, resource in input_resources.items():
-            use_ratio = max(use_ratio, resource.Mass/max_per_unit[name])
-        self.num_mocks = math.ceil(use_ratio)
+        # Masses and per-unit limits are packed into aligned lists for the scaling kernel
+        transform = self.Transform
+        max_per_unit = transform.get_input_mass_vector(delta_time)
+        index = transform._in_index
+        resources = list(input_resources.values())
+        masses = [resource.Mass for resource in resources]
+        limits = [max_per_unit[index[name]] for name in input_resources]
+        self.num_mocks, unit_masses = _mux_scale(masses, limits)
+        if unit_masses is None:
+            # Single unit - run the underlying process directly without the scale down / up round trip
+            return super().run(delta_time, input_resources)
         # Scale all resources and power down by the mock ratio
-        for name in input_resources:
-            input_resources[name].setMass(input_resources[name].Mass / self.num_mocks)
+        for resource, unit_mass in zip(resources, unit_masses):
+            resource._setMassUnchecked(unit_mass)
         # Call and capture the underlying transformation
         step_outputs = super().run(delta_time, input_resources)
         # Scale power and mass back up, then return
-        self.energy_demand *= self.num_mocks
-        for name in step_outputs:
-            step_outputs[name].setMass(step_outputs[name].Mass * self.num_mocks)
+        num_mocks = self.num_mocks
+        self.energy_demand *= num_mocks
+        for resource in step_outputs.values():
+            resource._setMassUnchecked(resource.Mass * num_mocks)
         return step_outputs
 
 
@@ -40,26 +62,34 @@ class Multiplex(Process):
         # Safety protection, used in cases where a certain part of the chain is uninteresting / unconstrained
         if request_resources is None:
             return None
-        max_per_unit = self.Transform.get_output_masses(delta_time)
-        use_ratio = 0
-        for name, resource in request_resources.items():
-            use_ratio = max(use_ratio, resource.Mass/max_per_unit[name])
-        self.num_mocks = math.ceil(use_ratio)
+        transform = self.Transform
+        max_per_unit = transform.get_output_mass_vector(delta_time)
+        index = transform._out_index
+        resources = list(request_resources.values())
+        masses = [resource.Mass for resource in resources]
+        limits = [max_per_unit[index[name]] for name in request_resources]
+        self.num_mocks, unit_masses = _mux_scale(masses, limits)
+        if unit_masses is None:
+            # Single unit - pass the request straight through without the scale down / up round trip
+            return super().request(delta_time, request_resources)
         # Scale all resources down by the mock ratio
-        for name in request_resources:
-            request_resources[name].setMass(request_resources[name].Mass / self.num_mocks)
+        for resource, unit_mass in zip(resources, unit_masses):
+            resource._setMassUnchecked(unit_mass)
         # Call and capture the underlying transformation
         step_requests = super().request(delta_time, request_resources)
         # Scale power and mass back up, then return
-        self.energy_demand *= self.num_mocks
-        for name in step_requests:
-            step_requests[name].setMass(step_requests[name].Mass * self.num_mocks)
+        num_mocks = self.num_mocks
+        self.energy_demand *= num_mocks
+        for resource in step_requests.values():
+            resource._setMassUnchecked(resource.Mass * num_mocks)
         return step_requests
 
 # This class defines a starting point for a production chain. It contains resources at
 # a fixed ratio but unlimited potential supply. Calling request() sets the necessary minimum
 # output rate, which is then returned when run() is called
 class ResourceDeposit(Process):
+    __slots__ = ('ResourceFractions', 'Phase', 'output_rate', '_resource_classes', '_frac_items')
+
     def __init__(self, arg_name="deposit_undefined", arg_resources={},
                  arg_phase='SOLID', arg_temp=mars.temperature, arg_press=mars.pressure):
         super().__init__(arg_name)
@@ -69,7 +99,11 @@ class ResourceDeposit(Process):
         self.Temperature = arg_temp
         self.Pressure = arg_press
         self.output_rate = None
-        self.RequestWhitelist = list(arg_resources.keys())
+        self.RequestWhitelist = frozenset(arg_resources.keys())
+        # Resolve resource classes once rather than on every run
+        self._resource_classes = {name: getattr(resourceLib, name) for name in arg_resources}
+        # (name, fraction) pairs materialized once for the per-step loops
+        self._frac_items = tuple(arg_resources.items())
 
     def run(self, delta_time, input_resources):
         # Use the determined output rate to send resources to the next process in the chain
@@ -80,23 +114,28 @@ class ResourceDeposit(Process):
             raise ValueError("Unexpected input resources given to deposit {}".format(self.Name))
         self.energy_demand = 0 # The deposit itself requires no energy to exist
         output_resources = {}
-        for resource_name, mass_frac in self.ResourceFractions.items():
-            resource_mass = delta_time * self.output_rate * mass_frac
-            newClass = getattr(resourceLib, resource_name)
-            output_resources[resource_name] = newClass(resource_mass, self.Temperature, self.Pressure, self.Phase)
+        total_mass = delta_time * self.output_rate
+        # Every output shares the deposit's state, so read it once rather than per resource
+        temperature, pressure, phase = self.Temperature, self.Pressure, self.Phase
+        for resource_name, mass_frac in self._frac_items:
+            resource_mass = total_mass * mass_frac
+            newClass = self._resource_classes[resource_name]
+            output_resources[resource_name] = newClass(resource_mass, temperature, pressure, phase)
         return output_resources
 
     def request(self, delta_time, request_resources):
         # Requests can effectively always be met - determine the correct rate and set the output accordingly
         # Also assume the downstream consumer can handle pressure / temperature changes as needed
         self.output_rate = 0
+        fracs = self.ResourceFractions
+        inv_dt = 1.0/delta_time
         for name, request_resource in request_resources.items():
             # TODO: Handle 'ANY' requests _somewhere_ along the chain
             # Will require using transform phases and such
-            if name is not 'ANY':
-                if name not in self.ResourceFractions:
+            if name != 'ANY':
+                if name not in fracs:
                     raise ValueError("Requested resource {} not in deposit {}".format(name, self.Name))
-                resource_target_rate = request_resource.Mass / (delta_time*self.ResourceFractions[name])
+                resource_target_rate = request_resource.Mass * inv_dt / fracs[name]
                 self.output_rate = max(self.output_rate, resource_target_rate)
         self.energy_demand = 0 # The deposit itself requires no energy to exist
         return None # No further requests are needed in the processing chain
@@ -105,6 +144,9 @@ class ResourceDeposit(Process):
 # a fixed ratio and specified demand. Calling request() sets these parameters, while run()
 # stores the process input at the specified mass fraction and puts the rest in overage
 class ResourceDepot(Process):
+    __slots__ = ('ResourceFractions', 'Phase', 'request_mass', 'Contents', 'Overage', '_resource_classes',
+                 '_names', '_frac_items', '_frac_keyset', '_contents_buf', '_overage_buf')
+
     def __init__(self, arg_name="depot_undefined", arg_resources={},
                  arg_phase='LIQUID', arg_temp=None, arg_press=None, arg_mass=None):
         super().__init__(arg_name)
@@ -115,40 +157,63 @@ class ResourceDepot(Process):
         self.Pressure = arg_press
         self.request_mass = arg_mass
         self.Contents = None # This is where end products are populated
-        self.Whitelist = list(arg_resources.keys())
+        self.Whitelist = frozenset(arg_resources.keys())
+        # Resolve resource classes once rather than on every run / request
+        self._resource_classes = {name: getattr(resourceLib, name) for name in arg_resources}
+        # Resource names and (name, fraction) pairs materialized once for the per-step loops
+        self._names = list(arg_resources.keys())
+        self._frac_items = tuple(arg_resources.items())
+        self._frac_keyset = frozenset(arg_resources)
+        # Contents and Overage are filled in place each run; they are valid until the next call to run()
+        self._contents_buf = {}
+        self._overage_buf = {}
+
+    def __copy__(self):
+        clone = super().__copy__()
+        clone._contents_buf = {}
+        clone._overage_buf = {}
+        return clone
 
     def run(self, delta_time, input_resources):
         # Store resources only according to the specified mass fractions
         # TODO: Allow for an any/none option?
         if self.request_mass is None:
             raise ValueError("Failed to specify request mass from depot {}".format(self.Name))
-        for name in self.ResourceFractions:
-            if name not in input_resources:
-                raise ValueError("Depot {} not provided with requested resource {}".format(name))
-            if self.Phase != input_resources[name].Phase:
-                raise ValueError("Depot {} given resource {} with incorrect phase".format(self.Name, name))
+        missing = self._frac_keyset - input_resources.keys()
+        if missing:
+            raise ValueError("Depot {} not provided with requested resource(s) {}".format(self.Name, ", ".join(sorted(missing))))
+        wrong_phase = [name for name in self._names if input_resources[name].Phase != self.Phase]
+        if wrong_phase:
+            raise ValueError("Depot {} given resource(s) {} with incorrect phase".format(self.Name, ", ".join(wrong_phase)))
         # Update pressures and temperatures as needed
         self.energy_demand = 0
         self.configureInputs(input_resources)
         # Determine the correct amount of each resource to store
-        input_masses = {name: resource.Mass for name, resource in input_resources.items() if name in self.ResourceFractions}
-        use_mTot = 100*(self.request_mass)**2 # Choose a starting value so high no overage would ever be likely to exceed it
-        for name, mass in input_masses.items():
-            use_mTot = min(use_mTot, mass/self.ResourceFractions[name])
+        # The limiting resource sets the total stored mass; an empty depot stores nothing
+        use_mTot = min((input_resources[name].Mass/frac for name, frac in self._frac_items), default=0)
         # Subtract mass from inputs and place into Contents; put what remains into Overage
-        self.Contents = {}
-        self.Overage = {}
+        contents = self._contents_buf
+        overage = self._overage_buf
+        contents.clear()
+        overage.clear()
+        # Bind the per-resource lookups to locals for the loop below
+        fracs, classes, phase, zero_tol = self.ResourceFractions, self._resource_classes, self.Phase, ZERO_TOL
+        # Single pass over the inputs; each name is looked up in the fractions once
         for name, input_resource in input_resources.items():
-            if name not in self.ResourceFractions:
-                self.Overage[name] = input_resource
+            frac = fracs.get(name)
+            if frac is None:
+                overage[name] = input_resource
             else:
-                mass_removed = use_mTot*self.ResourceFractions[name]
+                mass_removed = use_mTot*frac
                 # Account for floating point error - if 99.999% of an input resource has been used, the entire resource has been used
-                if not abs(1-(input_resource.Mass/mass_removed)) <= ZERO_TOL:
+                # Compared as a scaled difference to avoid a divide (and a zero divide when nothing is stored)
+                if not (mass_removed > 0 and abs(input_resource.Mass - mass_removed) <= zero_tol*mass_removed):
                     input_resource.setMass(input_resource.Mass - mass_removed)
-                    self.Overage[name] = input_resource
-                resourceType = getattr(resourceLib, name)
-                self.Contents[name] = resourceType(mass_removed, input_resource.Temperature, input_resource.Pressure, self.Phase)
+                    overage[name] = input_resource
+                resourceType = classes[name]
+                contents[name] = resourceType(mass_removed, input_resource.Temperature, input_resource.Pressure, phase)
+        self.Contents = contents
+        self.Overage = overage
         return None # This indicates the end of the running chain
 
     def request(self, delta_time, request_resources):
@@ -159,9 +224,10 @@ class ResourceDepot(Process):
             # TODO: may change this later to allow more branching resource paths
             raise ValueError("Unexpected resource request given to depot {}".format(self.Name))
         request_resources = {}
-        for resource_name, mass_frac in self.ResourceFractions.items():
+        temperature, pressure, phase = self.Temperature, self.Pressure, self.Phase
+        for resource_name, mass_frac in self._frac_items:
             resource_mass = self.request_mass * mass_frac
-            newClass = getattr(resourceLib, resource_name)
-            request_resources[resource_name] = newClass(resource_mass, self.Temperature, self.Pressure, self.Phase)
+            newClass = self._resource_classes[resource_name]
+            request_resources[resource_name] = newClass(resource_mass, temperature, pressure, phase)
         self.energy_demand = 0 # Depots request no energy, but may use energy to change resource temperature / pressure as needed
         return request_resources
@@ -9,6 +9,10 @@ from processes import *
 
 DEBUG_PRINT = False
 
+# Unit conversions used in reports
+J_PER_KWH = 3600000
+W_PER_KW = 1000
+
 # Sample definition dictionary. TODO: remove when fully deprecated
 sample_def = {
     'Basic_Regolith': {
@@ -41,10 +45,52 @@ sample_def = {
     },
 }
 
+# Single report line for a resource quantity
+def _resource_line(name, resource):
+    return "    {} kg of {} ({})".format(round(resource.Mass, 3), name, resource.Phase)
+
+# Input assembly for a single link into a process, chosen per link when the plant is built. Each moves the
+# resources a process takes from one upstream node into input_resources and out of that node's output buffer,
+# so whatever is left at the end of a run is that node's overage
+def _take_all_inputs(upstream_node, input_resources, names):
+    input_resources.update(upstream_node.Output_Resources)
+    upstream_node.Output_Resources = {}
+
+# The filtered variants find the names to take first, then move each out of the upstream buffer once
+def _take_whitelisted_inputs(upstream_node, input_resources, names):
+    unique_inputs = upstream_node.Output_Resources
+    for name in [name for name in unique_inputs if name in names]:
+        input_resources[name] = unique_inputs.pop(name)
+
+def _take_unblacklisted_inputs(upstream_node, input_resources, names):
+    unique_inputs = upstream_node.Output_Resources
+    for name in [name for name in unique_inputs if name not in names]:
+        input_resources[name] = unique_inputs.pop(name)
+
+# A single process in a plant chain: its model, its links to other nodes and its per-step results
+# From / To hold the linked ChainNodes (None where there are no links), Index is the node's position in the plant
+class ChainNode:
+    __slots__ = ('Name', 'Index', 'Model', 'From', 'To', 'Input_Links', 'Resource_Request', 'Energy_Request',
+                 'Output_Resources', 'Energy_Used')
+
+    def __init__(self, arg_name, arg_index, arg_model):
+        self.Name = arg_name
+        self.Index = arg_index
+        self.Model = arg_model
+        self.From = None
+        self.To = None
+        self.Input_Links = None # Per upstream node: (node, input assembly function, name set used by that function)
+        self.Resource_Request = None
+        self.Energy_Request = 0
+        self.Output_Resources = None
+        self.Energy_Used = 0
+
 # TODO: Add support for multiple input sources to a process
 class ISRUPlant():
     def __init__(self, model_definitions={}):
         # Class parameters used in processing and post-processing
+        # The result dicts are allocated once and cleared in place by each setup() / run(); the per-process
+        # entries stored in them are the plant's own copies, so an entry kept by a caller stays valid
         self.projected_energy = 0
         self.actual_energy = 0
         self.baseline_requests = {}
@@ -55,30 +101,146 @@ class ISRUPlant():
         self.Deposits = {}
         self.Depots = {}
         self.Chain = {}
-        # Copy and parse definitions into a doubly-linked list
+        # Copy and parse definitions into a doubly-linked list of ChainNodes
+        # Definitions are shared templates - take a shallow per-plant copy of each model so that the
+        # recipe data (transforms, components, fractions) is shared while run state stays with this plant
         for key, data in model_definitions.items():
-            model = data['Model']
+            model = copy.copy(data['Model'])
+            self.Chain[key] = ChainNode(key, len(self.Chain), model)
             # Note deposits and depots separately for ease of post processing
             if isinstance(model, ResourceDeposit):
                 self.Deposits[key] = model
             elif isinstance(model, ResourceDepot):
                 self.Depots[key] = model
-        self.Chain = model_definitions
         # Populate double-linkage information
-        for key, data in self.Chain.items():
-            if 'From' not in data:
-                data['From'] = None
-            else:
+        for key, data in model_definitions.items():
+            if 'From' in data:
+                node = self.Chain[key]
+                node.From = []
                 for backlink in data['From']:
                     if backlink not in self.Chain:
                         raise ValueError("Found link to unknown model {}".format(backlink))
-                    new_data = self.Chain[backlink]
-                    if 'To' not in new_data:
-                        new_data['To'] = []
-                    new_data['To'].append(key)
-        for key, data in self.Chain.items():
-            if 'To' not in data:
-                data['To'] = None
+                    upstream_node = self.Chain[backlink]
+                    node.From.append(upstream_node)
+                    if upstream_node.To is None:
+                        upstream_node.To = []
+                    upstream_node.To.append(node)
+        # Freeze the links into tuples of node references now that every node exists
+        for node in self.Chain.values():
+            if node.From is not None:
+                node.From = tuple(node.From)
+            if node.To is not None:
+                node.To = tuple(node.To)
+        # Resolve how each node takes resources from each of its upstream nodes. This only depends on the
+        # graph and the models' whitelists, so it is decided once here rather than on every run
+        for node in self.Chain.values():
+            if node.From is not None:
+                node.Input_Links = tuple((upstream_node, *self._inputLink(node, upstream_node)) for upstream_node in node.From)
+        # Tabulate the graph once as integer node ids, so scheduling walks tuples of ints rather than names
+        self._nodes = list(self.Chain.values())
+        self._links = {
+            'From': [tuple(linked.Index for linked in node.From) if node.From is not None else () for node in self._nodes],
+            'To': [tuple(linked.Index for linked in node.To) if node.To is not None else () for node in self._nodes],
+        }
+        # The graph is fixed once built, so the execution orders for setup (backwards) and run (forwards) are too
+        self._order_setup = self._schedule('To')
+        self._order_run = self._schedule('From')
+
+
+    def _inputLink(self, node, upstream_node):
+        # Filtered processes only take the resources allowed by their transform
+        if node.Model.Filter:
+            return _take_whitelisted_inputs, node.Model.Whitelist
+        # Edge case: mix of filtered and non-filtered processes receiving from the same node
+        # If so, non-filtered process calculates a "negative whitelist" and uses that
+        # Of course, this means two non-filtered processes cannot receive from the same node
+        if len(upstream_node.To) > 1:
+            blacklist = set()
+            for output_node in upstream_node.To:
+                if output_node is not node:
+                    blacklist.update(output_node.Model.Whitelist)
+            return _take_unblacklisted_inputs, frozenset(blacklist)
+        return _take_all_inputs, None
+
+    def _schedule(self, link):
+        # Determine the order in which processes execute, following links of the given type ('To' for setup,
+        # 'From' for run). Processes run in waves - a process is ready once every process it links to has run
+        # Scheduled with in-degree counters (Kahn's algorithm), one wave at a time; within a wave processes keep
+        # their definition order
+        links = self._links[link]
+        pending = [len(linked) for linked in links]
+        dependents = [[] for _ in links]
+        for process, linked in enumerate(links):
+            for dependency in linked:
+                dependents[dependency].append(process)
+        schedule = []
+        wave = [process for process, count in enumerate(pending) if count == 0]
+        while len(wave) > 0:
+            schedule += wave
+            next_wave = []
+            for process in wave:
+                for dependent in dependents[process]:
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        next_wave.append(dependent)
+            next_wave.sort()
+            wave = next_wave
+        # Any process never released sits on (or behind) a cycle; reject the plant definition outright
+        if len(schedule) < len(links):
+            stuck = [node.Name for node, count in zip(self._nodes, pending) if count > 0]
+            raise ValueError("Cycle detected in plant graph involving {}".format(", ".join(stuck)))
+        return [self._nodes[process] for process in schedule]
+
+    def _requestProcess(self, node, delta_t):
+        # Single backwards step of the plant: gather the requests of all downstream processes and pass them to this one
+        model = node.Model
+        requested_resources = None
+        if node.To is not None:
+            requested_resources = {}
+            for downstream_node in node.To:
+                # TODO: Handle conflicts between downstream process requests?
+                if downstream_node.Resource_Request is not None:
+                    if len(downstream_node.From) > 1:
+                        # TODO: add logic to detect if a request goes untended at a split like this
+                        use_requests = {name: resource for name, resource in downstream_node.Resource_Request.items() if name in model.RequestWhitelist}
+                        requested_resources.update(use_requests)
+                    else:
+                        requested_resources.update(downstream_node.Resource_Request)
+        # Note when we derive a starting resource quantity request
+        if node.Name in self.Deposits:
+            self.baseline_requests[node.Name] = requested_resources
+        node.Resource_Request = model.request(delta_t, requested_resources)
+        node.Energy_Request = model.energy_demand
+        self.projected_energy += model.energy_demand
+
+    def _runProcess(self, node, delta_t):
+        # Single forwards step of the plant: gather the outputs of all upstream processes and run this one on them
+        model = node.Model
+        input_resources = None
+        if node.From is not None:
+            input_resources = {}
+            # TODO: handle collisions?
+            for upstream_node, take_inputs, names in node.Input_Links:
+                take_inputs(upstream_node, input_resources, names)
+        node.Output_Resources = model.run(delta_t, input_resources)
+        node.Energy_Used = model.energy_demand
+        # This debug is useful enough it's staying permanently
+        if DEBUG_PRINT:
+            if node.Name in self.Depots:
+                print("Process {} storing:".format(node.Name))
+                for name, resource in model.Contents.items():
+                        print(_resource_line(name, resource))
+            else:
+                print("Process {} outputting:".format(node.Name))
+                for name, resource in node.Output_Resources.items():
+                        print(_resource_line(name, resource))
+        # Note when we derive an initial or final resource quantity
+        if node.Name in self.Depots:
+            # Copied, since the depot refills its Contents dict in place on every run
+            self.output_produced[node.Name] = dict(model.Contents)
+        if node.Name in self.Deposits:
+            self.input_consumed[node.Name] = {name: resource.clone() for name, resource in node.Output_Resources.items()}
+        self.actual_energy += model.energy_demand
 
 
     def setup(self, requested_outputs, delta_t):
@@ -86,7 +248,7 @@ class ISRUPlant():
         # Necessary setup to execute the plant
         # Reset configuration parameters
         self.projected_energy = 0
-        self.baseline_requests = {}
+        self.baseline_requests.clear()
         for name, deposit in self.Deposits.items():
             deposit.output_rate = None
         # Requested_outputs should be a dictionary of the form {depotName: massRequest}
@@ -95,55 +257,9 @@ class ISRUPlant():
                 raise ValueError("Given unknown depot name {}".format(depot))
             self.Depots[depot].request_mass = mass
 
-        # Set up chain for iteration
-        for process in self.Chain:
-            if self.Chain[process]['To'] is None:
-                self.Chain[process]['Ready'] = True
-            else:
-                self.Chain[process]['Ready'] = False
-            self.Chain[process]['Run'] = False
-        process_outstanding = list(self.Chain.keys())
-
-        # Iterate through the chain - run what is ready, then update new processes to run
-        # If we ever go through the whole loop without enabling a new process, throw an error
-        while len(process_outstanding) > 0:
-            run_processes = []
-            for process in process_outstanding:
-                if self.Chain[process]['Ready']:
-                    model = self.Chain[process]['Model']
-                    requested_resources = None
-                    if self.Chain[process]['To'] is not None:
-                        requested_resources = {}
-                        for downstream_process in self.Chain[process]['To']:
-                            # TODO: Handle conflicts between downstream process requests?
-                            if self.Chain[downstream_process]['Resource_Request'] is not None:
-                                if len(self.Chain[downstream_process]['From']) > 1:
-                                    # TODO: add logic to detect if a request goes untended at a split like this
-                                    use_requests = {name: resource for name, resource in self.Chain[downstream_process]['Resource_Request'].items() if name in model.RequestWhitelist}
-                                    requested_resources = requested_resources | use_requests
-                                else:
-                                    requested_resources = requested_resources | self.Chain[downstream_process]['Resource_Request']
-                    # Note when we derive a starting resource quantity request
-                    if process in self.Deposits:
-                        self.baseline_requests[process] = requested_resources
-                    #print(process)
-                    self.Chain[process]['Resource_Request'] = model.request(delta_t, requested_resources)
-                    #print("{} requested {}".format(process, self.Chain[process]['Resource_Request']))
-                    self.Chain[process]['Energy_Request'] = model.energy_demand
-                    self.Chain[process]['Run'] = True
-                    self.projected_energy += model.energy_demand
-                    run_processes.append(process)
-            if len(run_processes) < 1:
-                raise Exception("Plant failed to execute any new processes. Dead end in chain encountered")
-            for process in run_processes:
-                process_outstanding.remove(process)
-
-            for process in process_outstanding:
-                readyToRun = True
-                for downstream_process in self.Chain[process]['To']:
-                    if not self.Chain[downstream_process]['Run']:
-                        readyToRun = False
-                self.Chain[process]['Ready'] = readyToRun
+        # Iterate through the chain backwards, requesting from each process once everything downstream has run
+        for node in self._order_setup:
+            self._requestProcess(node, delta_t)
 
         # When the request chain is complete, confirm all Deposits have received requests
         for name, deposit in self.Deposits.items():
@@ -158,97 +274,21 @@ class ISRUPlant():
         # Given known targets configured via setup(), execute the plant.
         # Reset configuration parameters
         self.actual_energy = 0
-        self.input_consumed = {}
-        self.output_produced = {}
-        self.overages = {}
-
-        # Set up chain for iteration
-        for process in self.Chain:
-            if self.Chain[process]['From'] is None:
-                self.Chain[process]['Ready'] = True
-            else:
-                self.Chain[process]['Ready'] = False
-            self.Chain[process]['Run'] = False
-        process_outstanding = list(self.Chain.keys())
-
-        # Iterate through the chain - run what is ready, then update new processes to run
-        # If we ever go through the whole loop without enabling a new process, throw an error
-        while len(process_outstanding) > 0:
-            run_processes = []
-            for process in process_outstanding:
-                if self.Chain[process]['Ready']:
-                    model = self.Chain[process]['Model']
-                    input_resources = None
-                    if self.Chain[process]['From'] is not None:
-                        input_resources = {}
-                        source_mapping = {}
-                        for upstream_process in self.Chain[process]['From']:
-                            unique_inputs = self.Chain[upstream_process]['Output_Resources']
-                            # TODO: handle collisions?
-                            for name in unique_inputs:
-                                source_mapping[name] = upstream_process
-                            if self.Chain[process]['Model'].Filter:
-                                # Only pass along the resources allowed by the transform
-                                filtered_resources = {name: resource for name, resource in unique_inputs.items() if name in model.Whitelist}
-                                input_resources = input_resources | filtered_resources
-                                # Also remove those resources from the output buffer to clearly define the overage at the end
-                                for name in filtered_resources:
-                                    del self.Chain[upstream_process]['Output_Resources'][name]
-                            # Edge case: mix of filtered and non-filtered processes receiving from the same node
-                            # If so, non-filtered process calculates a "negative whitelist" and uses that
-                            # Of course, this means two non-filtered processes cannot receive from the same node
-                            elif len(self.Chain[upstream_process]['To']) > 1:
-                                blacklist = []
-                                for output in self.Chain[upstream_process]['To']:
-                                    if output != process:
-                                        blacklist += self.Chain[output]['Model'].Whitelist
-                                # Only pass along the resources allowed by the blacklist
-                                filtered_resources = {name: resource for name, resource in unique_inputs.items() if name not in blacklist}
-                                input_resources = input_resources | filtered_resources
-                                # Also remove those resources from the output buffer
-                                for name in filtered_resources:
-                                    del self.Chain[upstream_process]['Output_Resources'][name]
-                            else:
-                                input_resources = input_resources | self.Chain[upstream_process]['Output_Resources']
-                                self.Chain[upstream_process]['Output_Resources'] = {}
-                    self.Chain[process]['Output_Resources'] = model.run(delta_t, input_resources)
-                    self.Chain[process]['Energy_Used'] = model.energy_demand
-                    self.Chain[process]['Run'] = True
-                    # This debug is useful enough it's staying permanently
-                    if DEBUG_PRINT:
-                        if process in self.Depots:
-                            print("Process {} storing:".format(process))
-                            for name, resource in self.Chain[process]['Model'].Contents.items():
-                                    print("    {} kg of {} ({})".format(round(resource.Mass, 3), name, resource.Phase))
-                        else:
-                            print("Process {} outputting:".format(process))
-                            for name, resource in self.Chain[process]['Output_Resources'].items():
-                                    print("    {} kg of {} ({})".format(round(resource.Mass, 3), name, resource.Phase))
-                    # Note when we derive an initial or final resource quantity
-                    if process in self.Depots:
-                        self.output_produced[process] = self.Chain[process]['Model'].Contents
-                    if process in self.Deposits:
-                        self.input_consumed[process] = copy.deepcopy(self.Chain[process]['Output_Resources'])
-                    self.actual_energy += model.energy_demand
-                    run_processes.append(process)
-            if len(run_processes) < 1:
-                raise Exception("Plant failed to execute any new processes. Dead end in chain encountered")
-            for process in run_processes:
-                process_outstanding.remove(process)
+        self.input_consumed.clear()
+        self.output_produced.clear()
+        self.overages.clear()
 
-            for process in process_outstanding:
-                readyToRun = True
-                for upstream_process in self.Chain[process]['From']:
-                    if not self.Chain[upstream_process]['Run']:
-                        readyToRun = False
-                self.Chain[process]['Ready'] = readyToRun
+        # Iterate through the chain forwards, running each process once everything upstream has run
+        for node in self._order_run:
+            self._runProcess(node, delta_t)
 
         # At the conclusion of processing, note what overages remain across the system
-        for process in self.Chain:
+        for process, node in self.Chain.items():
+            # Copied, since models refill their Overage / output dicts in place on every run
             if process in self.Depots:
-                self.overages[process] = self.Chain[process]['Model'].Overage
-            elif process not in self.Deposits and len(self.Chain[process]['Output_Resources']) > 0:
-                self.overages[process] = self.Chain[process]['Output_Resources']
+                self.overages[process] = dict(node.Model.Overage)
+            elif process not in self.Deposits and len(node.Output_Resources) > 0:
+                self.overages[process] = dict(node.Output_Resources)
 
         # Finally, convert energy to power
         self.actual_power = self.actual_energy / delta_t
@@ -259,38 +299,41 @@ class ISRUPlant():
     def reportSummary(self):
         dT = self.actual_energy / self.actual_power
         # Data output function - reports on power usage, products, and overages
-        print("Used {} kWh at a rate of {} kW".format(round(self.actual_energy/3600000, 3), round(self.actual_power/1000, 3)))
+        # The report is built up as a list of lines and returned as a single string, leaving I/O to the caller
+        report = []
+        report.append("Used {} kWh at a rate of {} kW".format(round(self.actual_energy/J_PER_KWH, 3), round(self.actual_power/W_PER_KW, 3)))
         peak_power = 0
-        for p_name, process in self.Chain.items():
-            model = process['Model']
-            p_power=0
+        for p_name, node in self.Chain.items():
+            model = node.Model
+            p_power = 0
             if model.duty_cycle > 0.0001:
-                p_power = round(model.energy_demand/(dT*1000*model.duty_cycle), 3)
+                p_power = round(model.energy_demand/(dT*W_PER_KW*model.duty_cycle), 3)
             peak_power += p_power
             if isinstance(model, Multiplex):
-                print("    Process {} utilized {} kWh at a duty cycle of {} and {} instances -> {} kW".format(p_name, round(model.energy_demand/3600000, 3), round(model.duty_cycle,3), model.num_mocks, p_power))
+                report.append("    Process {} utilized {} kWh at a duty cycle of {} and {} instances -> {} kW".format(p_name, round(model.energy_demand/J_PER_KWH, 3), round(model.duty_cycle, 3), model.num_mocks, p_power))
             else:
-                print("    Process {} utilized {} kWh at a duty cycle of {} -> {} kW".format(p_name, round(model.energy_demand/3600000, 3), round(model.duty_cycle,3), p_power))
-        print("Peak plant power usage is {} kW".format(peak_power))
+                report.append("    Process {} utilized {} kWh at a duty cycle of {} -> {} kW".format(p_name, round(model.energy_demand/J_PER_KWH, 3), round(model.duty_cycle, 3), p_power))
+        report.append("Peak plant power usage is {} kW".format(peak_power))
         for depot in self.Depots:
-            print("Depot {} produced:".format(depot))
+            report.append("Depot {} produced:".format(depot))
             if self.output_produced[depot] is not None:
                 for name, output in self.output_produced[depot].items():
-                    print("    {} kg of {} ({})".format(round(output.Mass, 3), name, output.Phase))
+                    report.append(_resource_line(name, output))
         if True or DEBUG_PRINT:
             for deposit in self.Deposits:
-                print("Extracted from deposit {}:".format(deposit))
+                report.append("Extracted from deposit {}:".format(deposit))
                 if self.input_consumed[deposit] is not None:
                     for name, input in self.input_consumed[deposit].items():
-                        print("    {} kg of {} ({})".format(round(input.Mass, 3), name, input.Phase))
+                        report.append(_resource_line(name, input))
             for process, resources in self.baseline_requests.items():
-                print("Process {} reported a starting request for:".format(process))
+                report.append("Process {} reported a starting request for:".format(process))
                 for name, resource in resources.items():
-                    print("    {} kg of {} ({})".format(round(resource.Mass, 3), name, resource.Phase))
+                    report.append(_resource_line(name, resource))
         for process, resources in self.overages.items():
-            print("Process {} reported an overage of:".format(process))
+            report.append("Process {} reported an overage of:".format(process))
             for name, resource in resources.items():
-                print("    {} kg of {} ({})".format(round(resource.Mass, 3), name, resource.Phase))
+                report.append(_resource_line(name, resource))
+        return "\n".join(report)
 
 
 if __name__ =='__main__':
@@ -299,4 +342,4 @@ if __name__ =='__main__':
     dT = 3600*24 # In one day
     testPlant.setup(request, dT)
     testPlant.run(dT)
-    testPlant.reportSummary()
+    print(testPlant.reportSummary())
@@ -1,207 +1,114 @@
 # This file defines resource classes which inherit from the abstract Resource type
 # Where needed, sources are included as comments
 import mars
-from abstract_resource import *
+from types import MappingProxyType
+from abstract_resource import Resource
 
 # Densities are nominal pressure / temperature values; real density will vary with both.
 # TODO: Especially for water, determine if higher fidelity is needed / if volume is used at all
 
-class Water(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='SOLID'):
-        super().__init__(self.__class__.__name__)
-        self.Density = {'SOLID': 916, 'LIQUID': 1000}
-        self.Molar_Mass = 0.01802
-        self.Temperature = arg_temp
-        self.Pressure = arg_press
-        self.Phase = arg_phase
-        self.Gamma = 1.32
-        self.Cp = 2050
-        self.setMass(arg_mass)
-
-# Gaseous / diatomic oxygen
-class Oxygen(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='GAS'):
-        super().__init__(self.__class__.__name__)
-        self.Density = {'LIQUID': 1141}
-        self.Molar_Mass = 0.032
-        self.Temperature = arg_temp
-        self.Pressure = arg_press
-        self.Phase = arg_phase
-        self.Gamma = 1.4
-        self.Cp = 1452
-        self.setMass(arg_mass)
-
-# Gaseous / diatomic nitrogen
-class Nitrogen(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='GAS'):
-        super().__init__(self.__class__.__name__)
-        self.Density = {'LIQUID': 807}
-        self.Molar_Mass = 0.02802
-        self.Temperature = arg_temp
-        self.Pressure = arg_press
-        self.Phase = arg_phase
-        self.Gamma = 1.45
-        self.Cp = 2000
-        self.setMass(arg_mass)
-
-# Gaseous / diatomic hydrogen
-class Hydrogen(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='GAS'):
-        super().__init__(self.__class__.__name__)
-        self.Density = {'LIQUID': 70.85}
-        self.Molar_Mass = 0.002016
-        self.Temperature = arg_temp
-        self.Pressure = arg_press
-        self.Phase = arg_phase
-        self.Gamma = 1.41
-        self.Cp = 14290
-        self.setMass(arg_mass)
-
-
-class Methane(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='GAS'):
-        super().__init__(self.__class__.__name__)
-        self.Density = {'SOLID': 433, 'LIQUID': 422}
-        self.Molar_Mass = 0.016
-        self.Temperature = arg_temp
-        self.Pressure = arg_press
-        self.Phase = arg_phase
-        self.Gamma = 1.35
-        self.Cp = 2191
-        self.setMass(arg_mass)
-
-
-class Carbon_Dioxide(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='GAS'):
-        super().__init__(self.__class__.__name__)
-        self.Density = {'SOLID': 1564}
-        self.Molar_Mass = 0.044
-        self.Temperature = arg_temp
-        self.Pressure = arg_press
-        self.Phase = arg_phase
-        self.Gamma = 1.3
-        self.Cp = 815
-        self.setMass(arg_mass)
-
-# Trace gas in Martian atmosphere
-class Carbon_Monoxide(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='GAS'):
-        super().__init__(self.__class__.__name__)
-        self.Molar_Mass = 0.028
-        self.Temperature = arg_temp
-        self.Pressure = arg_press
-        self.Phase = arg_phase
-        self.Gamma = 1.4
-        self.Cp = 1036
-        self.setMass(arg_mass)
-
-# Trace gas in Martian atmosphere
-class Argon(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='GAS'):
-        super().__init__(self.__class__.__name__)
-        self.Molar_Mass = 0.03995
-        self.Temperature = arg_temp
-        self.Pressure = arg_press
-        self.Phase = arg_phase
-        self.Gamma = 1.67
-        self.setMass(arg_mass)
-
-# Released by regolith heating
-class Sulphur_Dioxide(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='GAS'):
-        super().__init__(self.__class__.__name__)
-        self.Molar_Mass = 0.06401
-        self.Temperature = arg_temp
-        self.Pressure = arg_press
-        self.Phase = arg_phase
-        self.Gamma = 1.29
-        self.Cp = 622
-        self.setMass(arg_mass)
-
-# Generic substitute for input Martian regolith.
-class Mars_Regolith(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='SOLID'):
-        super().__init__(self.__class__.__name__)
-        # Average of several MGS-1 simulants
-        self.Density = {'SOLID': 1300}
-        self.Temperature = arg_temp
-        self.Phase = arg_phase
-        # https://agupubs.onlinelibrary.wiley.com/doi/epdf/10.1029/2024GL108600
-        self.Cp = 620
-        self.setMass(arg_mass)
-
-# Generic substitute for bagged Martian regolith.
-class Mars_Regolith_Bagged(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='SOLID'):
-        super().__init__(self.__class__.__name__)
-        # Average of several MGS-1 simulants
-        self.Density = {'SOLID': 1300}
-        self.Temperature = arg_temp
-        self.Phase = arg_phase
-        # https://agupubs.onlinelibrary.wiley.com/doi/epdf/10.1029/2024GL108600
-        self.Cp = 620
-        self.setMass(arg_mass)
-
-# Generic standin for hydrated Martian minerals, such as clays or gypsum. Simulants contain around 40% of this by mass
-# Density and CP for this and following regolith "components" are just the simulant standard; the distinction doesn't
-# impact calculation as long as the hydrates are not separated from the rest of the regolith before heating
-class Mars_Mineral_Hydrate_Wet(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='SOLID'):
-        super().__init__(self.__class__.__name__)
-        # Average of several MGS-1 simulants
-        self.Density = {'SOLID': 1300}
-        self.Temperature = arg_temp
-        self.Phase = arg_phase
-        # https://agupubs.onlinelibrary.wiley.com/doi/epdf/10.1029/2024GL108600
-        self.Cp = 620
-        self.setMass(arg_mass)
-
-# Generic standin for hydrated Martian minerals, such as clays or gypsum, post-heating
-class Mars_Mineral_Hydrate_Dry(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='SOLID'):
-        super().__init__(self.__class__.__name__)
-        # Average of several MGS-1 simulants
-        self.Density = {'SOLID': 1300}
-        self.Temperature = arg_temp
-        self.Phase = arg_phase
-        # https://agupubs.onlinelibrary.wiley.com/doi/epdf/10.1029/2024GL108600
-        self.Cp = 620
-        self.setMass(arg_mass)
-
-# Generic standin for sintered Martian regolith - density and CP values don't matter unless
-# the glass is further post-processed
-class Mars_Basaltic_Glass(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='SOLID'):
-        super().__init__(self.__class__.__name__)
-        # Average of several MGS-1 simulants
-        self.Density = {'SOLID': 1300, 'LIQUID': 1300}
-        self.Temperature = arg_temp
-        self.Phase = arg_phase
-        # https://agupubs.onlinelibrary.wiley.com/doi/epdf/10.1029/2024GL108600
-        self.Cp = 620
-        self.setMass(arg_mass)
-
-# Generic standin for the metal alloy produced by MRE, predominantly Al but with Si, Fe, Ti
-# components as well. As with other regolith end products, density / CP are fairly unimportant
-class Mars_Metal_Alloy(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='SOLID'):
-        super().__init__(self.__class__.__name__)
-        # Average of several MGS-1 simulants
-        self.Density = {'SOLID': 1300}
-        self.Temperature = arg_temp
-        self.Phase = arg_phase
-        # https://agupubs.onlinelibrary.wiley.com/doi/epdf/10.1029/2024GL108600
-        self.Cp = 620
-        self.setMass(arg_mass)
-
-# Generic standin for the waste material produced by MRE
-class Mars_Slag(Resource):
-    def __init__(self, arg_mass, arg_temp=mars.temperature, arg_press=mars.pressure, arg_phase='SOLID'):
-        super().__init__(self.__class__.__name__)
-        # Average of several MGS-1 simulants
-        self.Density = {'SOLID': 1300}
-        self.Temperature = arg_temp
-        self.Phase = arg_phase
-        # https://agupubs.onlinelibrary.wiley.com/doi/epdf/10.1029/2024GL108600
-        self.Cp = 620
-        self.setMass(arg_mass)
+# Regolith and its processing products share the simulant's bulk properties and differ only by name
+# Density is the average of several MGS-1 simulants; Cp from https://agupubs.onlinelibrary.wiley.com/doi/epdf/10.1029/2024GL108600
+_MARS_SOLID = {'Phase': 'SOLID', 'Density': {'SOLID': 1300}, 'Pressure': 0, 'Cp': 620}
+
+# Per-species data for every concrete resource type. 'Phase' is the default phase for new instances; all
+# other entries are constants shared by every instance of the species. Every species defines Density and Cp;
+# those with a gas model also define Molar_Mass and Gamma. Regolith components fix Pressure at 0, since pressure isn't tracked for them
+RESOURCE_TABLE = {
+    'Water': {'Phase': 'SOLID', 'Density': {'SOLID': 916, 'LIQUID': 1000}, 'Molar_Mass': 0.01802, 'Gamma': 1.32, 'Cp': 2050},
+    # Gaseous / diatomic oxygen
+    'Oxygen': {'Phase': 'GAS', 'Density': {'LIQUID': 1141}, 'Molar_Mass': 0.032, 'Gamma': 1.4, 'Cp': 1452},
+    # Gaseous / diatomic nitrogen
+    'Nitrogen': {'Phase': 'GAS', 'Density': {'LIQUID': 807}, 'Molar_Mass': 0.02802, 'Gamma': 1.45, 'Cp': 2000},
+    # Gaseous / diatomic hydrogen
+    'Hydrogen': {'Phase': 'GAS', 'Density': {'LIQUID': 70.85}, 'Molar_Mass': 0.002016, 'Gamma': 1.41, 'Cp': 14290},
+    'Methane': {'Phase': 'GAS', 'Density': {'SOLID': 433, 'LIQUID': 422}, 'Molar_Mass': 0.016, 'Gamma': 1.35, 'Cp': 2191},
+    'Carbon_Dioxide': {'Phase': 'GAS', 'Density': {'SOLID': 1564}, 'Molar_Mass': 0.044, 'Gamma': 1.3, 'Cp': 815},
+    # Trace gas in Martian atmosphere. Liquid density at the normal boiling point
+    'Carbon_Monoxide': {'Phase': 'GAS', 'Density': {'LIQUID': 789}, 'Molar_Mass': 0.028, 'Gamma': 1.4, 'Cp': 1036},
+    # Trace gas in Martian atmosphere. Liquid density at the normal boiling point
+    'Argon': {'Phase': 'GAS', 'Density': {'LIQUID': 1395}, 'Molar_Mass': 0.03995, 'Gamma': 1.67, 'Cp': 520},
+    # Released by regolith heating. Liquid density at the normal boiling point
+    'Sulphur_Dioxide': {'Phase': 'GAS', 'Density': {'LIQUID': 1460}, 'Molar_Mass': 0.06401, 'Gamma': 1.29, 'Cp': 622},
+    # Generic substitute for input Martian regolith.
+    'Mars_Regolith': _MARS_SOLID,
+    # Generic substitute for bagged Martian regolith.
+    'Mars_Regolith_Bagged': _MARS_SOLID,
+    # Generic standin for hydrated Martian minerals, such as clays or gypsum. Simulants contain around 40% of this by mass
+    # Density and CP for this and following regolith "components" are just the simulant standard; the distinction doesn't
+    # impact calculation as long as the hydrates are not separated from the rest of the regolith before heating
+    'Mars_Mineral_Hydrate_Wet': _MARS_SOLID,
+    # Generic standin for hydrated Martian minerals, such as clays or gypsum, post-heating
+    'Mars_Mineral_Hydrate_Dry': _MARS_SOLID,
+    # Generic standin for sintered Martian regolith - density and CP values don't matter unless
+    # the glass is further post-processed
+    'Mars_Basaltic_Glass': {**_MARS_SOLID, 'Density': {'SOLID': 1300, 'LIQUID': 1300}},
+    # Generic standin for the metal alloy produced by MRE, predominantly Al but with Si, Fe, Ti
+    # components as well. As with other regolith end products, density / CP are fairly unimportant
+    'Mars_Metal_Alloy': _MARS_SOLID,
+    # Generic standin for the waste material produced by MRE
+    'Mars_Slag': _MARS_SOLID,
+}
+
+# Stands in for the current Martian surface temperature / pressure, which are read from mars at construction
+# time so changes to the mars module (e.g. scenario sweeps) apply without reloading this one. None can't be
+# used here, since it is a meaningful (unknown) temperature / pressure
+_MARS_DEFAULT = object()
+
+# Shared constructor for all concrete resource types, which differ only in their RESOURCE_TABLE entry
+# Species constants (Name, Density, Molar_Mass, Gamma, Cp and the derived gas constants) live on the generated
+# class and are shared by every instance, so construction only sets the per-instance state
+# These constants are read-only on instances: the class attributes shadow the matching Resource slots, so assigning
+# e.g. water.Cp raises AttributeError. A plain Resource, whose slots include all of them, can instead be given its
+# own properties for a one-off material
+class SpeciesResource(Resource):
+    __slots__ = ()
+    # Species without a gas model have no derived gas constants
+    _inv_gamma = None
+    _gamma_ratio = None
+    _cp_coeff = None
+
+    def __init__(self, arg_mass, arg_temp=_MARS_DEFAULT, arg_press=_MARS_DEFAULT, arg_phase=None):
+        if arg_temp is _MARS_DEFAULT:
+            arg_temp = mars.temperature
+        if arg_press is _MARS_DEFAULT:
+            arg_press = mars.pressure
+        self.Temperature = arg_temp
+        self.Pressure = arg_press if self._fixed_pressure is None else self._fixed_pressure
+        self.Phase = self._default_phase if arg_phase is None else arg_phase
+        self.setMass(arg_mass)
+
+# Builds the class for one species from its table entry. Density is also exposed as a read-only mapping since it is shared
+def _species_class(arg_name, arg_properties):
+    # Fail at import rather than partway through a simulation if a table entry is incomplete
+    # The gas model needs both Molar_Mass and Gamma, so a species defining either must define both
+    required = ['Phase', 'Density', 'Cp']
+    if 'Molar_Mass' in arg_properties or 'Gamma' in arg_properties:
+        required += ['Molar_Mass', 'Gamma']
+    missing = [name for name in required if name not in arg_properties]
+    if missing:
+        raise ValueError("Resource {} is missing {}".format(arg_name, ", ".join(missing)))
+    constants = {name: value for name, value in arg_properties.items() if name not in ('Phase', 'Pressure')}
+    constants['Density'] = MappingProxyType(dict(arg_properties['Density']))
+    constants.setdefault('Molar_Mass', 0)
+    constants['Name'] = arg_name
+    # Gas constants depend only on the species, so they are derived once here rather than per instance
+    # Same expressions as Resource.setGasConstants
+    gamma, molar_mass = constants.get('Gamma'), constants['Molar_Mass']
+    if gamma is not None and molar_mass != 0:
+        constants['_inv_gamma'] = 1/gamma
+        constants['_gamma_ratio'] = (gamma-1)/gamma
+        constants['_cp_coeff'] = gamma*8.314/(molar_mass*(gamma-1))
+    constants['_default_phase'] = arg_properties['Phase']
+    constants['_fixed_pressure'] = arg_properties.get('Pressure')
+    constants['__module__'] = __name__
+    constants['__slots__'] = ()
+    return type(arg_name, (SpeciesResource,), constants)
+
+# Generate one class per species, so each resource keeps its own type (used for lookups by name and pickling)
+for _species, _properties in RESOURCE_TABLE.items():
+    globals()[_species] = _species_class(_species, _properties)
+del _species, _properties
+
+# Star imports only pick up the species classes, not this module's own imports
+__all__ = list(RESOURCE_TABLE)
@@ -0,0 +1,90 @@
+# Tests for the abstract resource type. Run with python -m unittest
+import unittest
+from abstract_resource import *
+from abstract_process import Compress, Heat
+import resources
+
+
+class GammalessGasTest(unittest.TestCase):
+    # A gas without a Gamma value only lacks the compression / heating constants; its volume still follows the ideal gas law
+    def makeGas(self):
+        gas = Resource("Gammaless_Gas")
+        gas.Phase = 'GAS'
+        gas.Molar_Mass = 0.028
+        gas.Temperature = 300
+        gas.Pressure = 1000
+        return gas
+
+    def test_setMass_computes_ideal_gas_volume(self):
+        gas = self.makeGas()
+        gas.setMass(1.0)
+        self.assertAlmostEqual(gas.Volume, 1.0*300*8.314 / (1000*0.028))
+        self.assertIsNone(gas._cp_coeff)
+
+    def test_rescale_computes_ideal_gas_volume(self):
+        gas = self.makeGas()
+        gas.setMass(1.0)
+        gas._setMassUnchecked(2.0)
+        self.assertAlmostEqual(gas.Volume, 2.0*300*8.314 / (1000*0.028))
+
+
+class SpeciesConstantsTest(unittest.TestCase):
+    # Species constants are shared class attributes, derived once per species
+    def test_species_gas_constants_are_precomputed(self):
+        oxygen = resources.Oxygen(1.0)
+        self.assertEqual(oxygen._cp_coeff, 1.4*8.314/(0.032*(1.4-1)))
+
+    def test_species_constants_are_read_only(self):
+        # Instances can't override the shared constants
+        water = resources.Water(1.0)
+        with self.assertRaises(AttributeError):
+            water.Cp = 1000
+        with self.assertRaises(TypeError):
+            water.Density['SOLID'] = 1000
+
+    def test_plain_resource_takes_own_constants(self):
+        # A plain Resource is the way to model a one-off material with its own properties
+        material = Resource("One_Off")
+        material.Cp = 1000
+        material.Gamma = 1.3
+        material.Density = {'SOLID': 2000}
+        self.assertEqual((material.Cp, material.Gamma, material.Density['SOLID']), (1000, 1.3, 2000))
+
+
+class PlainResourceThermoTest(unittest.TestCase):
+    # A plain Resource given its own thermal properties can be compressed / heated; the gas constants
+    # are derived on first use. Expected energies are those of the original (pre-caching) models
+    def makeGas(self):
+        gas = Resource("Plain_Gas")
+        gas.Phase = 'GAS'
+        gas.Molar_Mass = 0.028
+        gas.Gamma = 1.4
+        gas.Temperature = 300
+        gas.Pressure = 1000
+        gas.setMass(1.0)
+        return gas
+
+    def test_compress_gas(self):
+        gas = self.makeGas()
+        self.assertAlmostEqual(Compress(2000, gas), 43480.7174929285)
+        self.assertEqual(gas.Pressure, 2000)
+        self.assertAlmostEqual(gas.Temperature, 365.7040962613426)
+        self.assertAlmostEqual(gas.Volume, 54.293997434228615)
+
+    def test_heat_gas(self):
+        gas = self.makeGas()
+        self.assertAlmostEqual(Heat(400, gas), 103925.00000000003)
+        self.assertEqual(gas.Temperature, 400)
+        self.assertAlmostEqual(gas.Volume, 118.77142857142856)
+
+    def test_heat_condensed(self):
+        solid = Resource("Plain_Solid")
+        solid.Density = {'SOLID': 1000}
+        solid.Cp = 900
+        solid.Temperature = 300
+        solid.setMass(1.0)
+        self.assertAlmostEqual(Heat(400, solid), 90000.0)
+
+
+if __name__ == '__main__':
+    unittest.main()